@@ -1,7 +1,17 @@
+import hashlib
+import io
+
+import numpy as np
 import streamlit as st
 import pandas as pd
 from datetime import timedelta
 
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional — the numpy paths below work without it
+    njit = None
+    prange = range
+
 st.set_page_config(page_title="Investment Toolkit", layout="wide")
 
 # ── Page selector ─────────────────────────────────────────────────────────────
@@ -13,33 +23,138 @@ WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
 # ══════════════════════════════════════════════════════════════════════════════
 #  PAGE 1 — DCA SIMULATOR
 # ══════════════════════════════════════════════════════════════════════════════
-def simulate(df: pd.DataFrame, amount: float, buy_mask: pd.Series) -> dict:
-    """Run a DCA simulation over *df* buying on rows where *buy_mask* is True."""
-    total_shares = 0.0
-    total_invested = 0.0
-    portfolio_values = []
-    invested_over_time = []
-
-    for idx, row in df.iterrows():
-        if buy_mask.loc[idx]:
-            shares = amount / row["Close"]
-            total_shares += shares
-            total_invested += amount
+@st.cache_data
+def load_and_clean(file_bytes: bytes, dayfirst: bool) -> pd.DataFrame:
+    """Parse, clean, and sort an uploaded price CSV. Cached on the file bytes
+    so reruns triggered by other widgets skip the parse entirely.
+
+    A header-only read locates the Date/Close columns first, so the full parse
+    materializes just those two, with Close allocated as float64 directly
+    instead of inferred as object and converted afterwards."""
+    buf = io.BytesIO(file_bytes)
+    header = pd.read_csv(buf, nrows=0)
+    col_map = {c.strip().lower(): c for c in header.columns}
+    if "date" not in col_map or "close" not in col_map:
+        raise ValueError("CSV must contain **Date** and **Close** columns.")
+    date_col, close_col = col_map["date"], col_map["close"]
+
+    buf.seek(0)
+    try:
+        df = pd.read_csv(buf, usecols=[date_col, close_col], dtype={close_col: "float64"})
+    except ValueError:  # non-numeric junk in Close — reparse with coercion
+        buf.seek(0)
+        df = pd.read_csv(buf, usecols=[date_col, close_col])
+        df[close_col] = pd.to_numeric(df[close_col], errors="coerce")
+
+    df = df.rename(columns={date_col: "Date", close_col: "Close"})[["Date", "Close"]]
+
+    # The user already told us the date order, so try the explicit formats
+    # (C-accelerated strptime) before falling back to per-row inference.
+    fmt = "%d/%m/%Y" if dayfirst else "%m/%d/%Y"
+    for full_fmt in (fmt, fmt + " %H:%M:%S"):
+        try:
+            df["Date"] = pd.to_datetime(df["Date"], format=full_fmt)
+            break
+        except (ValueError, TypeError):
+            continue
+    else:
+        df["Date"] = pd.to_datetime(df["Date"], dayfirst=dayfirst)
 
-        current_value = total_shares * row["Close"]
-        portfolio_values.append(current_value)
-        invested_over_time.append(total_invested)
+    df = df.dropna(subset=["Close"])
+    return df.sort_values("Date").reset_index(drop=True)
 
-    portfolio_series = pd.Series(portfolio_values, index=df["Date"].values)
-    invested_series = pd.Series(invested_over_time, index=df["Date"].values)
 
-    final_value = portfolio_values[-1] if portfolio_values else 0
+@st.cache_data
+def filter_trailing(df: pd.DataFrame, trailing_days: int) -> pd.DataFrame:
+    """Keep only the trailing window. Cached separately from load_and_clean so
+    dragging the trailing-days slider doesn't invalidate the parsed CSV."""
+    cutoff = df["Date"].max() - timedelta(days=trailing_days)
+    return df[df["Date"] >= cutoff].reset_index(drop=True)
+
+
+def _simulate_kernel(close: np.ndarray, mask: np.ndarray, amount: float):
+    """Fused single-pass simulation: holdings, invested cash, portfolio value,
+    and max drawdown in one walk over the price array. Compiled with numba
+    when available; the numpy path in simulate() is used otherwise."""
+    n = close.shape[0]
+    # float32 time series halve memory traffic; the running totals stay
+    # float64 scalars so long summations don't drift.
+    portfolio = np.empty(n, dtype=np.float32)
+    invested = np.empty(n, dtype=np.float32)
+    total_shares = 0.0
+    total_invested = 0.0
+    peak = 0.0
+    max_dd = 0.0
+    for i in range(n):
+        if mask[i]:
+            total_shares += amount / close[i]
+            total_invested += amount
+        value = total_shares * close[i]
+        portfolio[i] = value
+        invested[i] = total_invested
+        if value > peak:
+            peak = value
+        elif peak > 0:
+            dd = (value - peak) / peak
+            if dd < max_dd:
+                max_dd = dd
+    return portfolio, invested, max_dd
+
+
+def _simulate_batch_kernel(close: np.ndarray, masks: np.ndarray, amounts: np.ndarray):
+    """Batched _simulate_kernel: one strategy per column of the (N, S) *masks*
+    matrix, reading the price array once for all of them. Strategies are
+    independent, so the outer loop parallelizes with prange under numba."""
+    n, s = masks.shape
+    portfolios = np.empty((n, s), dtype=np.float32)
+    invested = np.empty((n, s), dtype=np.float32)
+    drawdowns = np.empty(s, dtype=np.float64)
+    for k in prange(s):
+        amount = amounts[k]
+        total_shares = 0.0
+        total_invested = 0.0
+        peak = 0.0
+        max_dd = 0.0
+        for i in range(n):
+            if masks[i, k]:
+                total_shares += amount / close[i]
+                total_invested += amount
+            value = total_shares * close[i]
+            portfolios[i, k] = value
+            invested[i, k] = total_invested
+            if value > peak:
+                peak = value
+            elif peak > 0:
+                dd = (value - peak) / peak
+                if dd < max_dd:
+                    max_dd = dd
+        drawdowns[k] = max_dd
+    return portfolios, invested, drawdowns
+
+
+if njit is not None:
+    _simulate_kernel = njit(cache=True, fastmath=True)(_simulate_kernel)
+    _simulate_batch_kernel = njit(cache=True, fastmath=True, parallel=True)(_simulate_batch_kernel)
+
+
+def _summarize(portfolio_values: np.ndarray, invested: np.ndarray, buy_count: int,
+               max_drawdown: float = None) -> dict:
+    """Build the per-strategy result dict from the simulated value arrays.
+
+    The _portfolio/_invested entries stay raw ndarrays — every strategy shares
+    the same Date index, so the caller attaches it once when charting instead
+    of paying index alignment per strategy."""
+    total_invested = float(invested[-1]) if len(invested) else 0.0
+    final_value = float(portfolio_values[-1]) if len(portfolio_values) else 0.0
     gain = final_value - total_invested
     gain_pct = (gain / total_invested * 100) if total_invested else 0
 
-    running_max = pd.Series(portfolio_values).cummax()
-    drawdowns = (pd.Series(portfolio_values) - running_max) / running_max
-    max_drawdown = drawdowns.min() * 100
+    if max_drawdown is None:
+        running_max = np.maximum.accumulate(portfolio_values)
+        drawdowns = np.where(
+            running_max > 0, (portfolio_values - running_max) / np.where(running_max > 0, running_max, 1.0), 0.0
+        )
+        max_drawdown = float(drawdowns.min()) * 100
 
     return {
         "Total Invested": round(total_invested, 2),
@@ -47,9 +162,59 @@ def simulate(df: pd.DataFrame, amount: float, buy_mask: pd.Series) -> dict:
         "Gain ($)": round(gain, 2),
         "Gain (%)": round(gain_pct, 2),
         "Max Drawdown (%)": round(max_drawdown, 2),
-        "Buy Count": int(buy_mask.sum()),
-        "_portfolio": portfolio_series,
-        "_invested": invested_series,
+        "Buy Count": int(buy_count),
+        "_portfolio": portfolio_values,
+        "_invested": invested,
+    }
+
+
+def simulate(df: pd.DataFrame, amount: float, buy_mask: pd.Series) -> dict:
+    """Run a DCA simulation over *df* buying on rows where *buy_mask* is True."""
+    # float32 is plenty for price series at display precision (2 decimals)
+    # and halves the bandwidth of the accumulate passes.
+    close = df["Close"].to_numpy(dtype=np.float32)
+    mask = np.asarray(buy_mask)
+
+    if njit is not None:
+        portfolio_values, invested, max_dd = _simulate_kernel(close, mask, float(amount))
+        return _summarize(portfolio_values, invested, mask.sum(), max_drawdown=max_dd * 100)
+
+    # Shares bought each day are amount/Close on buy days, so holdings and
+    # cash invested are just prefix sums — no need to walk the rows.
+    # Accumulate in float64 for accuracy, store the series as float32.
+    shares_bought = np.where(mask, amount / close, np.float32(0.0))
+    portfolio_values = (np.cumsum(shares_bought, dtype=np.float64) * close).astype(np.float32)
+    invested = np.cumsum(np.where(mask, amount, 0.0), dtype=np.float64).astype(np.float32)
+
+    return _summarize(portfolio_values, invested, mask.sum())
+
+
+def simulate_batch(df: pd.DataFrame, amounts: np.ndarray, masks: np.ndarray, names: list) -> dict:
+    """Simulate one strategy per column of the (N, S) boolean *masks* matrix.
+
+    All strategies share the same price series, so shares bought, holdings,
+    and invested cash for every strategy come out of a single broadcast
+    multiply plus one axis-0 cumsum — one buffer instead of S.
+    """
+    close = df["Close"].to_numpy(dtype=np.float32)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    buy_counts = masks.sum(axis=0)
+
+    if njit is not None:
+        portfolios, invested, drawdowns = _simulate_batch_kernel(close, masks, amounts)
+        return {
+            name: _summarize(portfolios[:, k], invested[:, k], buy_counts[k],
+                             max_drawdown=drawdowns[k] * 100)
+            for k, name in enumerate(names)
+        }
+
+    shares_bought = masks * (amounts / close[:, None])
+    portfolios = (np.cumsum(shares_bought, axis=0, dtype=np.float64) * close[:, None]).astype(np.float32)
+    invested = np.cumsum(masks * amounts, axis=0, dtype=np.float64).astype(np.float32)
+
+    return {
+        name: _summarize(portfolios[:, k], invested[:, k], buy_counts[k])
+        for k, name in enumerate(names)
     }
 
 
@@ -78,23 +243,13 @@ def run_dca_simulator():
         st.stop()
 
     # ── Load & prepare data ───────────────────────────────────────────────────
-    raw = pd.read_csv(uploaded_file)
-    raw.columns = [c.strip() for c in raw.columns]
-    col_map = {c.lower(): c for c in raw.columns}
-    if "date" not in col_map or "close" not in col_map:
-        st.error("CSV must contain **Date** and **Close** columns.")
+    try:
+        df = load_and_clean(uploaded_file.getvalue(), dayfirst=(date_format == "dd/mm/yyyy"))
+    except ValueError as exc:
+        st.error(str(exc))
         st.stop()
 
-    df = raw[[col_map["date"], col_map["close"]]].copy()
-    df.columns = ["Date", "Close"]
-    df["Date"] = pd.to_datetime(df["Date"], dayfirst=(date_format == "dd/mm/yyyy"))
-    df = df.dropna(subset=["Close"])
-    df["Close"] = pd.to_numeric(df["Close"], errors="coerce")
-    df = df.dropna(subset=["Close"])
-    df = df.sort_values("Date").reset_index(drop=True)
-
-    cutoff = df["Date"].max() - timedelta(days=trailing_days)
-    df = df[df["Date"] >= cutoff].reset_index(drop=True)
+    df = filter_trailing(df, trailing_days)
 
     if len(df) < 2:
         st.warning("Not enough data after filtering. Try increasing trailing days.")
@@ -103,21 +258,31 @@ def run_dca_simulator():
     st.subheader(f"Data: {df['Date'].min().date()} to {df['Date'].max().date()} ({len(df)} trading days)")
 
     # ── Build buy masks ───────────────────────────────────────────────────────
-    daily_mask = pd.Series(True, index=df.index)
-    strategies = {
-        "Daily ($/5 per day)": (daily_mask, invest_amount / 5),
-    }
-    for dow, day_name in enumerate(WEEKDAYS):
-        day_mask = df["Date"].dt.dayofweek == dow
-        strategies[f"Every {day_name}"] = (day_mask, invest_amount)
+    dow = df["Date"].dt.dayofweek.to_numpy().astype(np.int8)
+    weekday_masks = dow[:, None] == np.arange(5, dtype=np.int8)[None, :]  # (N, 5)
+    masks = np.hstack([np.ones((len(df), 1), dtype=bool), weekday_masks])
+    names = ["Daily ($/5 per day)"] + [f"Every {day_name}" for day_name in WEEKDAYS]
+    amounts = np.array([invest_amount / 5] + [invest_amount] * 5, dtype=np.float64)
 
     # ── Run simulations ───────────────────────────────────────────────────────
-    results = {}
-    for name, (mask, amount) in strategies.items():
-        if mask.sum() == 0:
+    active = masks.any(axis=0)
+    for name, is_active in zip(names, active):
+        if not is_active:
             st.warning(f"No buy days for strategy '{name}' in this period.")
-            continue
-        results[name] = simulate(df, amount, mask)
+    names = [name for name, is_active in zip(names, active) if is_active]
+
+    # Reuse the last run when nothing that feeds the simulation changed
+    # (e.g. the rerun came from toggling an expander or switching pages).
+    sim_key = (
+        hashlib.md5(uploaded_file.getvalue()).hexdigest(),
+        trailing_days, invest_amount, date_format,
+    )
+    if st.session_state.get("dca_key") == sim_key:
+        results = st.session_state["dca_results"]
+    else:
+        results = simulate_batch(df, amounts[active], masks[:, active], names) if names else {}
+        st.session_state["dca_key"] = sim_key
+        st.session_state["dca_results"] = results
 
     if not results:
         st.error("No strategies produced results. Check your data and settings.")
@@ -126,11 +291,21 @@ def run_dca_simulator():
     # ── Comparison table ──────────────────────────────────────────────────────
     st.subheader("Strategy Comparison")
     display_keys = ["Total Invested", "Final Value", "Gain ($)", "Gain (%)", "Max Drawdown (%)", "Buy Count"]
-    table_data = {name: {k: v for k, v in res.items() if k in display_keys} for name, res in results.items()}
-    comparison_df = pd.DataFrame(table_data).T
-    comparison_df.index.name = "Strategy"
+    strategy_names = list(results)
+    comparison_df = pd.DataFrame(
+        {k: [results[name][k] for name in strategy_names] for k in display_keys},
+        index=pd.Index(strategy_names, name="Strategy"),
+    )
+
+    # Pick the winner straight from the gains array and show the banner before
+    # the Styler work below, so it appears without waiting on table styling.
+    best_strategy = strategy_names[int(np.argmax([results[name]["Gain ($)"] for name in strategy_names]))]
+    st.success(
+        f"Best strategy by total gain: **{best_strategy}** with "
+        f"**${results[best_strategy]['Gain ($)']:,.2f}** gain "
+        f"({results[best_strategy]['Gain (%)']:.2f}%)"
+    )
 
-    best_strategy = comparison_df["Gain ($)"].idxmax()
     st.dataframe(
         comparison_df.style.highlight_max(subset=["Gain ($)", "Gain (%)"], color="#c6efce")
         .highlight_min(subset=["Max Drawdown (%)"], color="#ffc7ce")
@@ -143,15 +318,12 @@ def run_dca_simulator():
         }),
         use_container_width=True,
     )
-    st.success(
-        f"Best strategy by total gain: **{best_strategy}** with "
-        f"**${results[best_strategy]['Gain ($)']:,.2f}** gain "
-        f"({results[best_strategy]['Gain (%)']:.2f}%)"
-    )
 
     # ── Charts ────────────────────────────────────────────────────────────────
     st.subheader("Portfolio Value Over Time")
-    chart_df = pd.DataFrame({name: res["_portfolio"] for name, res in results.items()})
+    chart_df = pd.DataFrame(
+        {name: res["_portfolio"] for name, res in results.items()}, index=df["Date"].to_numpy()
+    )
     st.line_chart(chart_df)
 
     st.subheader("Total Invested vs Final Value")
@@ -181,86 +353,59 @@ def run_dca_simulator():
 #    5. Price Strength — how close price is to 52-week high vs low
 # ──────────────────────────────────────────────────────────────────────────────
 
-def score_valuation(pe: float) -> int:
+# ── Scoring tables ────────────────────────────────────────────────────────────
+# Bin edges and score lookups for the piecewise-constant scorers, hoisted to
+# module level so the vectorized scorers index shared arrays instead of
+# rebuilding the literals on every call. Scorers whose thresholds mix < and <=
+# keep np.select; the rest do a single np.digitize lookup.
+
+_PE_SCORES = np.asarray([0, 15, 20, 15, 10, 5], dtype=np.int8)     # losses → speculative
+_EPS_SCORES = np.asarray([0, 5, 10, 15, 20], dtype=np.int8)        # losses → strong earnings
+_BETA_SCORES = np.asarray([5, 20, 18, 15, 12, 8, 4], dtype=np.int8)  # inverse → highly volatile
+_MCAP_BINS = np.asarray([300e6, 2e9, 1e10, 5e10, 200e9], dtype=np.float64)
+_MCAP_SCORES = np.asarray([2, 5, 10, 15, 18, 20], dtype=np.int8)   # nano-cap → mega-cap
+_PS_BINS = np.asarray([0.2, 0.4, 0.6, 0.8], dtype=np.float64)
+_PS_SCORES = np.asarray([4, 8, 12, 16, 20], dtype=np.int8)         # near low → near high
+
+
+def score_valuation(pe: np.ndarray) -> np.ndarray:
     """Score P/E ratio (0-20). Moderate P/E is best; negative or extreme is worst."""
-    if pe <= 0:
-        return 0          # negative earnings
-    elif pe < 10:
-        return 15         # possibly value trap or cyclical
-    elif pe <= 20:
-        return 20         # healthy valuation
-    elif pe <= 30:
-        return 15         # growth premium
-    elif pe <= 50:
-        return 10         # expensive
-    else:
-        return 5          # speculative
+    return np.select(
+        [pe <= 0, pe < 10, pe <= 20, pe <= 30, pe <= 50],
+        _PE_SCORES[:-1],
+        default=_PE_SCORES[-1],
+    )
 
 
-def score_profitability(eps: float) -> int:
+def score_profitability(eps: np.ndarray) -> np.ndarray:
     """Score EPS (0-20). Higher positive EPS is better."""
-    if eps <= 0:
-        return 0          # losing money
-    elif eps < 1:
-        return 5
-    elif eps < 3:
-        return 10
-    elif eps < 6:
-        return 15
-    else:
-        return 20         # strong earnings
+    return np.select(
+        [eps <= 0, eps < 1, eps < 3, eps < 6],
+        _EPS_SCORES[:-1],
+        default=_EPS_SCORES[-1],
+    )
 
 
-def score_volatility(beta: float) -> int:
+def score_volatility(beta: np.ndarray) -> np.ndarray:
     """Score Beta (0-20). Lower beta = lower risk."""
-    if beta < 0:
-        return 5          # inverse — unusual
-    elif beta <= 0.5:
-        return 20         # very defensive
-    elif beta <= 0.8:
-        return 18
-    elif beta <= 1.0:
-        return 15         # market-like
-    elif beta <= 1.3:
-        return 12
-    elif beta <= 1.6:
-        return 8
-    else:
-        return 4          # highly volatile
+    return np.select(
+        [beta < 0, beta <= 0.5, beta <= 0.8, beta <= 1.0, beta <= 1.3, beta <= 1.6],
+        _BETA_SCORES[:-1],
+        default=_BETA_SCORES[-1],
+    )
 
 
-def score_size(marketcap: float) -> int:
+def score_size(marketcap: np.ndarray) -> np.ndarray:
     """Score Market Cap in USD (0-20). Larger = more stable."""
-    if marketcap >= 200e9:
-        return 20         # mega-cap
-    elif marketcap >= 50e9:
-        return 18         # large-cap
-    elif marketcap >= 10e9:
-        return 15         # mid-cap
-    elif marketcap >= 2e9:
-        return 10         # small-cap
-    elif marketcap >= 300e6:
-        return 5          # micro-cap
-    else:
-        return 2          # nano-cap
+    return _MCAP_SCORES[np.digitize(marketcap, _MCAP_BINS)]
 
 
-def score_price_strength(price: float, high52: float, low52: float) -> int:
+def score_price_strength(price: np.ndarray, high52: np.ndarray, low52: np.ndarray) -> np.ndarray:
     """Score where current price sits in 52-week range (0-20).
     Closer to high = stronger momentum / less downside risk."""
-    if high52 == low52:
-        return 10
-    pct = (price - low52) / (high52 - low52)  # 0 = at low, 1 = at high
-    if pct >= 0.8:
-        return 20         # near 52-week high — strong
-    elif pct >= 0.6:
-        return 16
-    elif pct >= 0.4:
-        return 12
-    elif pct >= 0.2:
-        return 8
-    else:
-        return 4          # near 52-week low — weak
+    span = high52 - low52
+    pct = (price - low52) / np.where(span != 0, span, 1.0)  # 0 = at low, 1 = at high
+    return np.where(span == 0, np.int8(10), _PS_SCORES[np.digitize(pct, _PS_BINS)])
 
 
 # ── Orchestrator ──────────────────────────────────────────────────────────────
@@ -268,39 +413,81 @@ def score_price_strength(price: float, high52: float, low52: float) -> int:
 REQUIRED_COLS = ["PE", "EPS", "Beta", "MarketCap", "High52", "Low52", "Price"]
 
 
+@st.cache_data
+def load_kpis(file_bytes: bytes, numeric_cols: tuple) -> pd.DataFrame:
+    """Parse an uploaded KPI CSV with whichever of *numeric_cols* are present
+    typed as float64 at parse time, skipping object-dtype inference. Cached on
+    the file bytes so scorer reruns skip the parse. Column validation stays
+    with the caller."""
+    buf = io.BytesIO(file_bytes)
+    header = pd.read_csv(buf, nrows=0)
+    col_map = {c.strip(): c for c in header.columns}
+    present = [c for c in numeric_cols if c in col_map]
+
+    buf.seek(0)
+    try:
+        raw = pd.read_csv(buf, dtype={col_map[c]: "float64" for c in present})
+    except ValueError:  # non-numeric junk in a KPI column — reparse with coercion
+        buf.seek(0)
+        raw = pd.read_csv(buf)
+        for c in present:
+            raw[col_map[c]] = pd.to_numeric(raw[col_map[c]], errors="coerce")
+
+    raw.columns = [c.strip() for c in raw.columns]
+    return raw.dropna(subset=present)
+
+
+RISK_COLORS = {
+    "Low Risk": "background-color: #c6efce; color: #006100",
+    "Moderate Risk": "background-color: #ffeb9c; color: #9c6500",
+    "Elevated Risk": "background-color: #ffc7ce; color: #9c0006",
+    "High Risk": "background-color: #ff9999; color: #800000",
+}
+
+
+def _risk_rating_styles(ratings: pd.Series) -> pd.Series:
+    """Styler column hook: map each rating to its style string in one pass."""
+    return ratings.map(RISK_COLORS).fillna("")
+
+
+def _risk_labels(composite: np.ndarray) -> np.ndarray:
+    """Map composite scores (0-100) to risk-rating labels."""
+    return np.select(
+        [composite >= 80, composite >= 60, composite >= 40],
+        ["Low Risk", "Moderate Risk", "Elevated Risk"],
+        default="High Risk",
+    )
+
+
+def _identifiers(df: pd.DataFrame, primary: str) -> np.ndarray:
+    """Pick the identifier column (*primary* or Ticker) as an array."""
+    if primary in df.columns:
+        return df[primary].to_numpy()
+    if "Ticker" in df.columns:
+        return df["Ticker"].to_numpy()
+    return np.full(len(df), "Unknown")
+
+
 def compute_risk_scores(df: pd.DataFrame) -> pd.DataFrame:
     """Compute risk scores for each row (company)."""
-    records = []
-    for _, row in df.iterrows():
-        val = score_valuation(row["PE"])
-        prof = score_profitability(row["EPS"])
-        vol = score_volatility(row["Beta"])
-        sz = score_size(row["MarketCap"])
-        ps = score_price_strength(row["Price"], row["High52"], row["Low52"])
-
-        composite = val + prof + vol + sz + ps
-
-        if composite >= 80:
-            risk_label = "Low Risk"
-        elif composite >= 60:
-            risk_label = "Moderate Risk"
-        elif composite >= 40:
-            risk_label = "Elevated Risk"
-        else:
-            risk_label = "High Risk"
-
-        identifier = row.get("Company", row.get("Ticker", "Unknown"))
-        records.append({
-            "Company": identifier,
-            "Valuation (0-20)": val,
-            "Profitability (0-20)": prof,
-            "Volatility (0-20)": vol,
-            "Size (0-20)": sz,
-            "Price Strength (0-20)": ps,
-            "Composite (0-100)": composite,
-            "Risk Rating": risk_label,
-        })
-    return pd.DataFrame(records)
+    val = score_valuation(df["PE"].to_numpy())
+    prof = score_profitability(df["EPS"].to_numpy())
+    vol = score_volatility(df["Beta"].to_numpy())
+    sz = score_size(df["MarketCap"].to_numpy())
+    ps = score_price_strength(df["Price"].to_numpy(), df["High52"].to_numpy(), df["Low52"].to_numpy())
+
+    composite = val + prof + vol + sz + ps
+
+    return pd.DataFrame({
+        "Company": _identifiers(df, "Company"),
+        "Valuation (0-20)": val,
+        "Profitability (0-20)": prof,
+        "Volatility (0-20)": vol,
+        "Size (0-20)": sz,
+        "Price Strength (0-20)": ps,
+        "Composite (0-100)": composite,
+        "Risk Rating": _risk_labels(composite),
+    })
 
 
 # ── Risk Scorer UI ────────────────────────────────────────────────────────────
@@ -446,8 +633,7 @@ H2: =GOOGLEFINANCE(A2, "price")
         st.stop()
 
     # ── Load & validate CSV ───────────────────────────────────────────────────
-    raw = pd.read_csv(uploaded)
-    raw.columns = [c.strip() for c in raw.columns]
+    raw = load_kpis(uploaded.getvalue(), tuple(REQUIRED_COLS))
 
     has_id = "Company" in raw.columns or "Ticker" in raw.columns
     if not has_id:
@@ -459,31 +645,24 @@ H2: =GOOGLEFINANCE(A2, "price")
         st.error(f"Missing columns: **{', '.join(missing)}**")
         st.stop()
 
-    for col in REQUIRED_COLS:
-        raw[col] = pd.to_numeric(raw[col], errors="coerce")
-    raw = raw.dropna(subset=REQUIRED_COLS)
-
     if len(raw) == 0:
         st.warning("No valid rows after cleaning. Check your data.")
         st.stop()
 
     # ── Compute scores ────────────────────────────────────────────────────────
-    results_df = compute_risk_scores(raw)
-    results_df = results_df.sort_values("Composite (0-100)", ascending=False).reset_index(drop=True)
+    score_key = hashlib.md5(uploaded.getvalue()).hexdigest()
+    if st.session_state.get("risk_key") == score_key:
+        results_df = st.session_state["risk_results"]
+    else:
+        results_df = compute_risk_scores(raw)
+        results_df = results_df.sort_values("Composite (0-100)", ascending=False).reset_index(drop=True)
+        st.session_state["risk_key"] = score_key
+        st.session_state["risk_results"] = results_df
     st.subheader(f"Risk Assessment — {len(results_df)} companies (sorted lowest → highest risk)")
 
     # ── 1. Breakdown table with color-coded risk ──────────────────────────────
-    def color_risk(val):
-        colors = {
-            "Low Risk": "background-color: #c6efce; color: #006100",
-            "Moderate Risk": "background-color: #ffeb9c; color: #9c6500",
-            "Elevated Risk": "background-color: #ffc7ce; color: #9c0006",
-            "High Risk": "background-color: #ff9999; color: #800000",
-        }
-        return colors.get(val, "")
-
     st.dataframe(
-        results_df.style.applymap(color_risk, subset=["Risk Rating"]),
+        results_df.style.apply(_risk_rating_styles, subset=["Risk Rating"]),
         use_container_width=True,
         hide_index=True,
     )
@@ -509,21 +688,33 @@ H2: =GOOGLEFINANCE(A2, "price")
     composition_df = results_df.set_index("Company")[sub_cols]
     st.bar_chart(composition_df)
 
-    # ── 4. Per-company detail expanders ───────────────────────────────────────
+    # ── 4. Per-company detail ─────────────────────────────────────────────────
+    # One styled table instead of 5 widgets per company — per-widget rendering
+    # dominates once watchlists grow past a few dozen rows.
     st.subheader("Detailed Breakdown")
-    for _, row in results_df.iterrows():
-        with st.expander(f"{row['Company']} — {row['Risk Rating']} ({row['Composite (0-100)']}/100)"):
+    st.dataframe(
+        results_df.style.apply(_risk_rating_styles, subset=["Risk Rating"])
+        .bar(subset=sub_cols, vmin=0, vmax=20, color="#5fba7d"),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    if not st.checkbox("Show per-company drill-down", key="risk_drilldown"):
+        return
+    # itertuples yields plain tuples instead of a Series per row
+    for company, val, prof, vol, sz, ps, composite, rating in results_df.itertuples(index=False, name=None):
+        with st.expander(f"{company} — {rating} ({composite}/100)"):
             c1, c2, c3, c4, c5 = st.columns(5)
             with c1:
-                st.metric("Valuation", f"{row['Valuation (0-20)']}/20")
+                st.metric("Valuation", f"{val}/20")
             with c2:
-                st.metric("Profitability", f"{row['Profitability (0-20)']}/20")
+                st.metric("Profitability", f"{prof}/20")
             with c3:
-                st.metric("Volatility", f"{row['Volatility (0-20)']}/20")
+                st.metric("Volatility", f"{vol}/20")
             with c4:
-                st.metric("Size", f"{row['Size (0-20)']}/20")
+                st.metric("Size", f"{sz}/20")
             with c5:
-                st.metric("Price Strength", f"{row['Price Strength (0-20)']}/20")
+                st.metric("Price Strength", f"{ps}/20")
 
 
 # ══════════════════════════════════════════════════════════════════════════════
@@ -541,70 +732,37 @@ H2: =GOOGLEFINANCE(A2, "price")
 #    5. Price Level      — higher price = more established ETF
 # ──────────────────────────────────────────────────────────────────────────────
 
-def score_range_tightness(high52: float, low52: float) -> int:
+# ── ETF scoring tables ────────────────────────────────────────────────────────
+
+_SPREAD_BINS = np.asarray([15, 25, 35, 50], dtype=np.float64)
+_SPREAD_SCORES = np.asarray([20, 16, 12, 8, 4], dtype=np.int8)     # tight → wide
+_VOLUME_BINS = np.asarray([100e3, 500e3, 1e6, 5e6, 10e6], dtype=np.float64)
+_VOLUME_SCORES = np.asarray([2, 5, 10, 15, 18, 20], dtype=np.int8)  # illiquid → liquid
+_CHG_BINS = np.asarray([0.5, 1.0, 1.5, 2.5, 4.0], dtype=np.float64)
+_CHG_SCORES = np.asarray([20, 16, 12, 8, 4, 0], dtype=np.int8)     # calm → volatile
+_PRICE_BINS = np.asarray([5, 20, 50, 100, 200], dtype=np.float64)
+_PRICE_SCORES = np.asarray([2, 5, 10, 15, 18, 20], dtype=np.int8)  # penny → established
+
+
+def score_range_tightness(high52: np.ndarray, low52: np.ndarray) -> np.ndarray:
     """Score how tight the 52-week range is (0-20). Tighter = safer."""
-    if high52 <= 0:
-        return 0
-    spread = (high52 - low52) / high52 * 100  # as percentage
-    if spread < 15:
-        return 20
-    elif spread < 25:
-        return 16
-    elif spread < 35:
-        return 12
-    elif spread < 50:
-        return 8
-    else:
-        return 4
+    spread = (high52 - low52) / np.where(high52 > 0, high52, 1.0) * 100  # as percentage
+    return np.where(high52 <= 0, np.int8(0), _SPREAD_SCORES[np.digitize(spread, _SPREAD_BINS)])
 
 
-def score_liquidity_vol(volume_avg: float) -> int:
+def score_liquidity_vol(volume_avg: np.ndarray) -> np.ndarray:
     """Score average daily volume (0-20). Higher = more liquid."""
-    if volume_avg > 10e6:
-        return 20
-    elif volume_avg > 5e6:
-        return 18
-    elif volume_avg > 1e6:
-        return 15
-    elif volume_avg > 500e3:
-        return 10
-    elif volume_avg > 100e3:
-        return 5
-    else:
-        return 2
+    return _VOLUME_SCORES[np.digitize(volume_avg, _VOLUME_BINS, right=True)]
 
 
-def score_daily_volatility(change_pct: float) -> int:
+def score_daily_volatility(change_pct: np.ndarray) -> np.ndarray:
     """Score absolute daily % change (0-20). Lower = less volatile."""
-    abs_chg = abs(change_pct)
-    if abs_chg < 0.5:
-        return 20
-    elif abs_chg < 1.0:
-        return 16
-    elif abs_chg < 1.5:
-        return 12
-    elif abs_chg < 2.5:
-        return 8
-    elif abs_chg < 4.0:
-        return 4
-    else:
-        return 0
+    return _CHG_SCORES[np.digitize(np.abs(change_pct), _CHG_BINS)]
 
 
-def score_price_level(price: float) -> int:
+def score_price_level(price: np.ndarray) -> np.ndarray:
     """Score share price (0-20). Higher price = more established ETF."""
-    if price > 200:
-        return 20
-    elif price > 100:
-        return 18
-    elif price > 50:
-        return 15
-    elif price > 20:
-        return 10
-    elif price > 5:
-        return 5
-    else:
-        return 2
+    return _PRICE_SCORES[np.digitize(price, _PRICE_BINS, right=True)]
 
 
 # ── ETF Orchestrator ──────────────────────────────────────────────────────────
@@ -614,37 +772,24 @@ ETF_REQUIRED_COLS = ["Price", "High52", "Low52", "VolumeAvg", "ChangePct"]
 
 def compute_etf_risk_scores(df: pd.DataFrame) -> pd.DataFrame:
     """Compute ETF risk scores for each row."""
-    records = []
-    for _, row in df.iterrows():
-        ps = score_price_strength(row["Price"], row["High52"], row["Low52"])
-        rt = score_range_tightness(row["High52"], row["Low52"])
-        liq = score_liquidity_vol(row["VolumeAvg"])
-        dv = score_daily_volatility(row["ChangePct"])
-        pl = score_price_level(row["Price"])
-
-        composite = ps + rt + liq + dv + pl
-
-        if composite >= 80:
-            risk_label = "Low Risk"
-        elif composite >= 60:
-            risk_label = "Moderate Risk"
-        elif composite >= 40:
-            risk_label = "Elevated Risk"
-        else:
-            risk_label = "High Risk"
-
-        identifier = row.get("ETF", row.get("Ticker", "Unknown"))
-        records.append({
-            "ETF": identifier,
-            "Price Strength (0-20)": ps,
-            "Range Tightness (0-20)": rt,
-            "Liquidity (0-20)": liq,
-            "Daily Volatility (0-20)": dv,
-            "Price Level (0-20)": pl,
-            "Composite (0-100)": composite,
-            "Risk Rating": risk_label,
-        })
-    return pd.DataFrame(records)
+    ps = score_price_strength(df["Price"].to_numpy(), df["High52"].to_numpy(), df["Low52"].to_numpy())
+    rt = score_range_tightness(df["High52"].to_numpy(), df["Low52"].to_numpy())
+    liq = score_liquidity_vol(df["VolumeAvg"].to_numpy())
+    dv = score_daily_volatility(df["ChangePct"].to_numpy())
+    pl = score_price_level(df["Price"].to_numpy())
+
+    composite = ps + rt + liq + dv + pl
+
+    return pd.DataFrame({
+        "ETF": _identifiers(df, "ETF"),
+        "Price Strength (0-20)": ps,
+        "Range Tightness (0-20)": rt,
+        "Liquidity (0-20)": liq,
+        "Daily Volatility (0-20)": dv,
+        "Price Level (0-20)": pl,
+        "Composite (0-100)": composite,
+        "Risk Rating": _risk_labels(composite),
+    })
 
 
 # ── ETF Risk Scorer UI ───────────────────────────────────────────────────────
@@ -784,8 +929,7 @@ F2: =GOOGLEFINANCE(A2, "changepct")
         st.stop()
 
     # ── Load & validate CSV ───────────────────────────────────────────────────
-    raw = pd.read_csv(uploaded)
-    raw.columns = [c.strip() for c in raw.columns]
+    raw = load_kpis(uploaded.getvalue(), tuple(ETF_REQUIRED_COLS))
 
     has_id = "ETF" in raw.columns or "Ticker" in raw.columns
     if not has_id:
@@ -797,31 +941,24 @@ F2: =GOOGLEFINANCE(A2, "changepct")
         st.error(f"Missing columns: **{', '.join(missing)}**")
         st.stop()
 
-    for col in ETF_REQUIRED_COLS:
-        raw[col] = pd.to_numeric(raw[col], errors="coerce")
-    raw = raw.dropna(subset=ETF_REQUIRED_COLS)
-
     if len(raw) == 0:
         st.warning("No valid rows after cleaning. Check your data.")
         st.stop()
 
     # ── Compute scores ────────────────────────────────────────────────────────
-    results_df = compute_etf_risk_scores(raw)
-    results_df = results_df.sort_values("Composite (0-100)", ascending=False).reset_index(drop=True)
+    score_key = hashlib.md5(uploaded.getvalue()).hexdigest()
+    if st.session_state.get("etf_key") == score_key:
+        results_df = st.session_state["etf_results"]
+    else:
+        results_df = compute_etf_risk_scores(raw)
+        results_df = results_df.sort_values("Composite (0-100)", ascending=False).reset_index(drop=True)
+        st.session_state["etf_key"] = score_key
+        st.session_state["etf_results"] = results_df
     st.subheader(f"ETF Risk Assessment — {len(results_df)} ETFs (sorted lowest → highest risk)")
 
     # ── 1. Breakdown table with color-coded risk ──────────────────────────────
-    def color_risk(val):
-        colors = {
-            "Low Risk": "background-color: #c6efce; color: #006100",
-            "Moderate Risk": "background-color: #ffeb9c; color: #9c6500",
-            "Elevated Risk": "background-color: #ffc7ce; color: #9c0006",
-            "High Risk": "background-color: #ff9999; color: #800000",
-        }
-        return colors.get(val, "")
-
     st.dataframe(
-        results_df.style.applymap(color_risk, subset=["Risk Rating"]),
+        results_df.style.apply(_risk_rating_styles, subset=["Risk Rating"]),
         use_container_width=True,
         hide_index=True,
     )
@@ -847,21 +984,30 @@ F2: =GOOGLEFINANCE(A2, "changepct")
     composition_df = results_df.set_index("ETF")[etf_sub_cols]
     st.bar_chart(composition_df)
 
-    # ── 4. Per-ETF detail expanders ───────────────────────────────────────────
+    # ── 4. Per-ETF detail ─────────────────────────────────────────────────────
     st.subheader("Detailed Breakdown")
-    for _, row in results_df.iterrows():
-        with st.expander(f"{row['ETF']} — {row['Risk Rating']} ({row['Composite (0-100)']}/100)"):
+    st.dataframe(
+        results_df.style.apply(_risk_rating_styles, subset=["Risk Rating"])
+        .bar(subset=etf_sub_cols, vmin=0, vmax=20, color="#5fba7d"),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+    if not st.checkbox("Show per-ETF drill-down", key="etf_drilldown"):
+        return
+    for etf, ps, rt, liq, dv, pl, composite, rating in results_df.itertuples(index=False, name=None):
+        with st.expander(f"{etf} — {rating} ({composite}/100)"):
             c1, c2, c3, c4, c5 = st.columns(5)
             with c1:
-                st.metric("Price Strength", f"{row['Price Strength (0-20)']}/20")
+                st.metric("Price Strength", f"{ps}/20")
             with c2:
-                st.metric("Range Tightness", f"{row['Range Tightness (0-20)']}/20")
+                st.metric("Range Tightness", f"{rt}/20")
             with c3:
-                st.metric("Liquidity", f"{row['Liquidity (0-20)']}/20")
+                st.metric("Liquidity", f"{liq}/20")
             with c4:
-                st.metric("Daily Volatility", f"{row['Daily Volatility (0-20)']}/20")
+                st.metric("Daily Volatility", f"{dv}/20")
             with c5:
-                st.metric("Price Level", f"{row['Price Level (0-20)']}/20")
+                st.metric("Price Level", f"{pl}/20")
 
 
 # ══════════════════════════════════════════════════════════════════════════════